@@ -1,4 +1,4 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response
 from config import config
 from core.database import db
 from core.port_scanner import PortScanner
@@ -7,16 +7,42 @@ from utils.system_info import get_system_info, get_system_load
 import threading
 import time
 import json
+import hashlib
 import logging
+from collections import Counter, deque
+from dataclasses import dataclass, field, replace
 from datetime import datetime, timedelta
 from functools import wraps
 import psutil
 
+# orjson为C实现的JSON编码器，序列化比stdlib快3-10倍；未安装时退回jsonify
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True, slots=True)
+class ScanSnapshot:
+    """一次扫描产出的不可变状态快照
+
+    扫描线程每轮构建新快照并整体替换引用；CPython中引用赋值在GIL下是
+    原子操作，请求处理器读取一次引用即可拿到last_scan/scan_stats/
+    port_stats的一致视图，无需加锁。
+    """
+    last_scan: dict = field(default_factory=lambda: {'current_ports': [], 'changes': []})
+    scan_stats: dict = field(default_factory=lambda: {
+        'total_scans': 0,
+        'last_scan_time': None,
+        'avg_scan_duration': 0
+    })
+    port_stats: dict | None = None
+
+
 def create_app():
     app = Flask(__name__)
     app.config.from_object(config)
@@ -26,50 +52,96 @@ def create_app():
 
     # 初始化组件
     scanner = PortScanner(config)
-    alert_manager = AlertManager(config)
+    # 绑定app启用异步告警写入（独立写线程批量落库）
+    alert_manager = AlertManager(config, app=app)
 
-    # 全局状态
+    # 全局状态：扫描产物集中在不可变快照里，整体替换保证读取一致性
     app_state = {
-        'last_scan': {'current_ports': [], 'changes': []},
-        'alerts': [],
-        'is_scanning': False,
-        'scan_stats': {
-            'total_scans': 0,
-            'last_scan_time': None,
-            'avg_scan_duration': 0
-        }
+        'snapshot': ScanSnapshot(),
+        # 环形缓冲区：maxlen自动淘汰最旧告警，插入O(1)且无切片拷贝
+        'alerts': deque(maxlen=100),
+        'is_scanning': False
     }
 
     # 缓存配置
-    cache = {
-        'port_status': {'data': None, 'timestamp': None},
-        'system_info': {'data': None, 'timestamp': None}
-    }
-
     CACHE_TIMEOUT = 2  # 缓存2秒
-
-    def cache_view(timeout):
+    CACHE_MAXSIZE = 128  # 单个视图缓存的条目上限
+
+    # 依赖扫描结果的视图缓存，扫描完成后统一失效
+    scan_dependent_caches = []
+
+    # 扫描唤醒事件：手动触发扫描时用于立即唤醒后台线程
+    wake_event = threading.Event()
+
+    # 网络连接快照：按本地端口索引，由后台扫描线程每轮刷新，请求路径直接复用
+    conn_cache = {'ts': 0, 'by_port': {}}
+
+    def refresh_conn_snapshot():
+        """重建网络连接快照（一次psutil调用服务所有端口查询）"""
+        by_port = {}
+        for conn in psutil.net_connections(kind='inet'):
+            if conn.laddr:
+                by_port.setdefault(conn.laddr.port, []).append(conn)
+        conn_cache['by_port'] = by_port
+        conn_cache['ts'] = time.time()
+
+    def get_connections_by_port(port):
+        """获取指定本地端口的连接列表（读取扫描线程维护的快照）"""
+        # 快照随扫描周期更新；仅当扫描线程停滞导致快照过期时才在请求路径重建
+        if time.time() - conn_cache['ts'] > config.SCAN_INTERVAL_IDLE + CACHE_TIMEOUT:
+            refresh_conn_snapshot()
+        return conn_cache['by_port'].get(port, [])
+
+    def cache_view(timeout, clear_on_scan=False):
+        """视图级TTL缓存，每个端点独立存储
+
+        clear_on_scan=True的缓存在每轮扫描后失效；
+        其余缓存（如system_info）跨扫描存活，减少psutil调用。
+        """
         def decorator(f):
+            view_cache = {}
+            if clear_on_scan:
+                scan_dependent_caches.append(view_cache)
+
             @wraps(f)
             def decorated_function(*args, **kwargs):
-                cache_key = f"{f.__name__}_{request.args}"
+                # 元组键避免每次请求构造f-string；
+                # 包含If-None-Match，避免304响应被错误地返回给未带条件头的客户端
+                cache_key = (tuple(sorted(request.args.items())),
+                             request.headers.get('If-None-Match', ''))
                 now = time.time()
 
-                if (cache_key in cache and
-                        now - cache[cache_key]['timestamp'] < timeout):
-                    return cache[cache_key]['data']
+                hit = view_cache.get(cache_key)
+                if hit is not None and now - hit[1] < timeout:
+                    return hit[0]
 
                 result = f(*args, **kwargs)
-                cache[cache_key] = {
-                    'data': result,
-                    'timestamp': now
-                }
+                # 简单的有界淘汰：超限时丢弃最早插入的条目
+                if len(view_cache) >= CACHE_MAXSIZE:
+                    view_cache.pop(next(iter(view_cache)))
+                view_cache[cache_key] = (result, now)
                 return result
 
             return decorated_function
 
         return decorator
 
+    def json_response(obj):
+        """构造JSON响应，优先使用orjson序列化"""
+        if orjson is not None:
+            return Response(orjson.dumps(obj), mimetype='application/json')
+        return jsonify(obj)
+
+    def compute_port_stats(ports):
+        """聚合端口统计信息（按协议/状态/进程计数）"""
+        # Counter的C实现比手写dict.get(x, 0) + 1计数快2-3倍
+        return {
+            'total': len(ports),
+            'by_protocol': dict(Counter(p.get('protocol', 'unknown') for p in ports)),
+            'by_state': dict(Counter(p.get('state', 'unknown') for p in ports)),
+            'top_processes': dict(Counter(p.get('process_name', 'unknown') for p in ports))
+        }
+
     def background_scanner():
         """后台扫描线程 - 添加调试日志"""
         with app.app_context():
@@ -83,7 +155,9 @@ def create_app():
 
                     # 执行扫描
                     scan_result = scanner.scan_ports()
-                    app_state['last_scan'] = scan_result
+
+                    # 同步刷新连接快照，port-detail请求无需再次解析/proc
+                    refresh_conn_snapshot()
 
                     # 添加调试日志
                     current_ports = scan_result.get('current_ports', [])
@@ -97,12 +171,17 @@ def create_app():
                     scan_count += 1
                     total_duration += scan_duration
 
-                    app_state['scan_stats'].update({
-                        'total_scans': scan_count,
-                        'last_scan_time': datetime.now(),
-                        'avg_scan_duration': total_duration / scan_count,
-                        'last_scan_duration': scan_duration
-                    })
+                    # 构建新快照并原子替换引用，统计信息在扫描线程预聚合
+                    app_state['snapshot'] = ScanSnapshot(
+                        last_scan=scan_result,
+                        scan_stats={
+                            'total_scans': scan_count,
+                            'last_scan_time': datetime.now(),
+                            'avg_scan_duration': total_duration / scan_count,
+                            'last_scan_duration': scan_duration
+                        },
+                        port_stats=compute_port_stats(current_ports)
+                    )
 
                     # 检查变化并生成告警
                     if changes.get('new_ports') or changes.get('closed_ports'):
@@ -111,9 +190,12 @@ def create_app():
                             alerts = alert_manager.check_port_changes(changes)
                             if alerts:
                                 logger.info(f"成功生成 {len(alerts)} 个告警")
-                                # 打印告警详情
+                                # check_port_changes返回轻量字典行，直接入环形缓冲区
+                                app_state['alerts'].extend(
+                                    dict(alert, timestamp=alert['timestamp'].isoformat())
+                                    for alert in alerts)
                                 for alert in alerts:
-                                    logger.info(f"告警: {alert.level} - {alert.message}")
+                                    logger.info(f"告警: {alert['level']} - {alert['message']}")
                             else:
                                 logger.warning("端口变化检测到，但未生成任何告警")
                         except Exception as alert_error:
@@ -130,18 +212,22 @@ def create_app():
                     if changes:
                         interval = config.SCAN_INTERVAL_BUSY
 
-                    # 清理缓存
-                    cache.clear()
+                    # 只失效依赖扫描结果的缓存，system_info等缓存跨扫描复用
+                    for view_cache in scan_dependent_caches:
+                        view_cache.clear()
 
                     logger.info(f"扫描完成，耗时 {scan_duration:.2f}s，下次扫描在 {interval}s 后")
-                    time.sleep(interval)
+                    # 使用事件等待代替sleep，手动触发扫描时可立即唤醒
+                    wake_event.wait(timeout=interval)
+                    wake_event.clear()
 
                 except Exception as e:
                     logger.error(f"Scanner error: {e}")
                     import traceback
                     logger.error(traceback.format_exc())
                     app_state['is_scanning'] = False
-                    time.sleep(10)
+                    wake_event.wait(timeout=10)
+                    wake_event.clear()
 
     # === 在 create_app() 内部启动后台线程 ===
     def start_background_scanner():
@@ -162,11 +248,12 @@ def create_app():
         return render_template('dashboard.html')
 
     @app.route('/api/port-status')
-    @cache_view(CACHE_TIMEOUT)
+    @cache_view(CACHE_TIMEOUT, clear_on_scan=True)
     def get_port_status():
         """获取端口状态"""
         try:
-            scan_data = app_state['last_scan'].copy()
+            snapshot = app_state['snapshot']
+            scan_data = dict(snapshot.last_scan)
 
             # 添加调试日志
             logger.info(f"Port status request - current ports: {len(scan_data.get('current_ports', []))}")
@@ -177,18 +264,29 @@ def create_app():
                 logger.info("No port data available, triggering immediate scan")
                 try:
                     scan_result = scanner.scan_ports()
-                    app_state['last_scan'] = scan_result
-                    scan_data = scan_result.copy()
+                    snapshot = replace(snapshot, last_scan=scan_result)
+                    app_state['snapshot'] = snapshot
+                    scan_data = dict(scan_result)
                 except Exception as scan_error:
                     logger.error(f"Immediate scan failed: {scan_error}")
 
             # 添加扫描统计信息
             scan_data.update({
-                'scan_stats': app_state['scan_stats'],
+                'scan_stats': snapshot.scan_stats,
                 'is_scanning': app_state['is_scanning']
             })
 
-            return jsonify(scan_data)
+            # 基于最后扫描时间生成ETag，数据未变化时返回304，省去JSON序列化和传输
+            etag = hashlib.md5(
+                str(snapshot.scan_stats['last_scan_time']).encode()
+            ).hexdigest()
+            if request.headers.get('If-None-Match') == etag:
+                return '', 304, {'ETag': etag}
+
+            resp = json_response(scan_data)
+            resp.headers['ETag'] = etag
+            resp.headers['Cache-Control'] = 'max-age=2'
+            return resp
         except Exception as e:
             logger.error(f"Error getting port status: {e}")
             return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
@@ -207,7 +305,17 @@ def create_app():
                 resolved_bool = resolved == 'true'
                 alerts = alert_manager.get_alerts(resolved=resolved_bool, limit=limit)
 
-            return jsonify([{
+            # ETag基于最新告警id、已解决数和查询参数：解决告警会改变
+            # resolved计数，保证resolve后旧ETag立即失效，不会304回放旧列表
+            latest_id = max((alert.id for alert in alerts), default=0)
+            resolved_count = sum(1 for alert in alerts if alert.resolved)
+            etag = hashlib.md5(
+                f"{latest_id}_{len(alerts)}_{resolved_count}_{resolved}_{limit}".encode()
+            ).hexdigest()
+            if request.headers.get('If-None-Match') == etag:
+                return '', 304, {'ETag': etag}
+
+            resp = json_response([{
                 'id': alert.id,
                 'title': alert.title,
                 'message': alert.message,
@@ -217,6 +325,8 @@ def create_app():
                 'timestamp': alert.timestamp.isoformat() if alert.timestamp else None,
                 'resolved': alert.resolved
             } for alert in alerts])
+            resp.headers['ETag'] = etag
+            return resp
 
         except Exception as e:
             logger.error(f"Error getting alerts: {e}")
@@ -227,9 +337,6 @@ def create_app():
     def system_info():
         """获取系统信息"""
         try:
-            # 导入必要的系统信息获取函数
-            from utils.system_info import get_system_info, get_system_load
-
             system_data = get_system_info()
             load_data = get_system_load()
 
@@ -272,17 +379,16 @@ def create_app():
             # 获取端口详细信息
             port_detail = scanner.get_port_detail(port)
 
-            # 获取相关连接信息
+            # 获取相关连接信息（O(1)查缓存索引，代替遍历全部连接）
             connections = []
-            for conn in psutil.net_connections():
-                if conn.laddr.port == port:
-                    connections.append({
-                        'local_address': conn.laddr.ip,
-                        'local_port': conn.laddr.port,
-                        'remote_address': conn.raddr.ip if conn.raddr else '',
-                        'remote_port': conn.raddr.port if conn.raddr else '',
-                        'state': conn.status
-                    })
+            for conn in get_connections_by_port(port):
+                connections.append({
+                    'local_address': conn.laddr.ip,
+                    'local_port': conn.laddr.port,
+                    'remote_address': conn.raddr.ip if conn.raddr else '',
+                    'remote_port': conn.raddr.port if conn.raddr else '',
+                    'state': conn.status
+                })
 
             port_detail['connections'] = connections
             return jsonify(port_detail)
@@ -309,13 +415,8 @@ def create_app():
             if app_state['is_scanning']:
                 return jsonify({'success': False, 'error': 'Scan already in progress'}), 409
 
-            # 在单独的线程中执行扫描
-            def quick_scan():
-                with app.app_context():
-                    scanner.scan_ports()
-
-            scan_thread = threading.Thread(target=quick_scan, daemon=True)
-            scan_thread.start()
+            # 唤醒后台扫描线程，立即执行下一轮扫描
+            wake_event.set()
 
             return jsonify({'success': True, 'message': 'Scan started'})
         except Exception as e:
@@ -326,35 +427,20 @@ def create_app():
     def get_stats():
         """获取统计信息"""
         try:
-            # 端口统计
-            ports = app_state['last_scan'].get('current_ports', [])
-            port_stats = {
-                'total': len(ports),
-                'by_protocol': {},
-                'by_state': {},
-                'top_processes': {}
-            }
-
-            for port in ports:
-                # 按协议统计
-                protocol = port.get('protocol', 'unknown')
-                port_stats['by_protocol'][protocol] = port_stats['by_protocol'].get(protocol, 0) + 1
-
-                # 按状态统计
-                state = port.get('state', 'unknown')
-                port_stats['by_state'][state] = port_stats['by_state'].get(state, 0) + 1
-
-                # 按进程统计
-                process = port.get('process_name', 'unknown')
-                port_stats['top_processes'][process] = port_stats['top_processes'].get(process, 0) + 1
+            # 端口统计：优先读取后台扫描预聚合的结果
+            snapshot = app_state['snapshot']
+            port_stats = snapshot.port_stats
+            if port_stats is None:
+                port_stats = compute_port_stats(
+                    snapshot.last_scan.get('current_ports', []))
 
             # 告警统计 - 使用修复后的方法
             alert_stats = alert_manager.get_alert_stats(hours=24)
 
-            return jsonify({
+            return json_response({
                 'port_stats': port_stats,
                 'alert_stats': alert_stats,
-                'scan_stats': app_state['scan_stats'],
+                'scan_stats': snapshot.scan_stats,
                 'system_uptime': time.time() - psutil.boot_time()
             })
 
@@ -383,12 +469,12 @@ def create_app():
     # 健康检查端点
     @app.route('/health')
     def health_check():
+        last_scan_time = app_state['snapshot'].scan_stats['last_scan_time']
         return jsonify({
             'status': 'healthy',
             'timestamp': datetime.now().isoformat(),
             'scanning': app_state['is_scanning'],
-            'last_scan': app_state['scan_stats']['last_scan_time'].isoformat() if app_state['scan_stats'][
-                'last_scan_time'] else None
+            'last_scan': last_scan_time.isoformat() if last_scan_time else None
         })
 
     return app
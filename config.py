@@ -16,7 +16,13 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_recycle': 300,
-        'pool_pre_ping': True
+        'pool_pre_ping': True,
+        # 并发API请求+后台扫描写入容易耗尽默认5个连接
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_timeout': 5,
+        # LIFO优先复用最近用过的（热）连接
+        'pool_use_lifo': True
     }
     
     # 扫描配置
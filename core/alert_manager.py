@@ -1,11 +1,17 @@
+import re
 import time
+from itertools import chain
+import queue
+import random
 import logging
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 from sqlalchemy.exc import OperationalError, DisconnectionError
+from sqlalchemy.orm import load_only
 
 # 尝试不同的导入方式
 try:
-    from core.database import Alert
+    from core.database import db, Alert
 except ImportError:
     try:
         from models.alert import Alert
@@ -37,22 +43,76 @@ except ImportError:
                 }
 
 
+# 列表查询只取/api/alerts实际序列化的列，构建一次复用；
+# 模型后续新增的列不会被顺带拉取和物化
+_LIST_COLUMNS = load_only(
+    Alert.id, Alert.level, Alert.title, Alert.message,
+    Alert.port, Alert.timestamp, Alert.resolved)
+
+
+# 告警消息模板：模块导入时构建一次，每次生成消息只做一次.format，
+# 避免每个端口变化都重建嵌套字典和多段f-string
+BASE_MESSAGES = {
+    'new': {
+        'ERROR': "🚨 高风险端口开启 - 端口 {port}/{protocol} 被进程 {process_name} 打开",
+        'WARNING': "⚠️ 端口异常开启 - 端口 {port}/{protocol} 被进程 {process_name} 打开",
+        'INFO': "📝 端口开启 - 端口 {port}/{protocol} 被进程 {process_name} 打开"
+    },
+    'closed': {
+        'ERROR': "🚨 关键端口关闭 - 端口 {port}/{protocol} 已关闭",
+        'WARNING': "⚠️ 端口异常关闭 - 端口 {port}/{protocol} 已关闭",
+        'INFO': "📝 端口关闭 - 端口 {port}/{protocol} 已关闭"
+    }
+}
+
+
 class AlertManager:
-    def __init__(self, config):
+    def __init__(self, config, app=None):
         self.config = config
         self.max_retries = 3
         self.retry_delay = 2
 
-        # 定义端口风险等级
-        self.high_risk_ports = {
+        # 异步写入：绑定app后告警经队列由独立写线程批量落库
+        self._app = app
+        self._alert_queue = None
+        self._max_batch = 500
+        self._flush_interval = 0.2  # 秒
+        if app is not None:
+            self._alert_queue = queue.Queue()
+            threading.Thread(target=self._writer_loop, daemon=True).start()
+
+        # 忽略端口列表，frozenset保证O(1)成员判断
+        self._ignore_ports = frozenset(getattr(config, 'IGNORE_PORTS', ()))
+
+        # 短窗口去重：(port, change_type) -> 过期时间戳
+        # 端口在单个扫描窗口内抖动(开/关/开)时不重复入库
+        self._recent_alerts = {}
+        self._dedup_ttl = 5
+
+        # 定义端口风险等级：初始化后只读，用frozenset并保证两个集合互斥
+        # （5432/6379曾同时出现在两个集合中，高风险优先）
+        self.high_risk_ports = frozenset({
             21, 22, 23, 25, 53, 80, 110, 135, 139, 143, 443, 993, 995,
             1433, 1434, 1723, 3306, 3389, 5432, 5900, 6379, 27017
-        }
+        })
 
-        self.medium_risk_ports = {
+        self.medium_risk_ports = frozenset({
             161, 389, 636, 873, 2049, 3128, 3690, 4848, 5000, 5432, 5901,
             5984, 6379, 7001, 8000, 8080, 8081, 8443, 9000, 9200, 9300
-        }
+        }) - self.high_risk_ports
+
+        # 检测可疑连接状态
+        self.suspicious_states = {'syn-sent', 'syn-recv', 'fin-wait-1', 'fin-wait-2', 'close-wait'}
+
+        # 高风险进程匹配：预编译正则一次C层扫描替代逐个子串判断，
+        # \b词边界同时修复了"enchant"误匹配"nc"之类的误报
+        self._high_risk_proc_re = re.compile(r'\b(nc|ncat|telnet|ftp|tftp|ssh|rsh|rexec)\b')
+        self._suspicious_tool_re = re.compile(r'\b(nc|ncat|telnet)\b')
+
+        # 预计算端口→告警级别查找表，热路径上单次哈希探测替代多个集合判断
+        self._new_level = {p: 'ERROR' for p in self.high_risk_ports}
+        self._new_level.update({p: 'WARNING' for p in self.medium_risk_ports})
+        self._closed_level = {p: 'WARNING' for p in self.high_risk_ports}
 
 
     def _db_operation_with_retry(self, operation, *args, **kwargs):
@@ -63,9 +123,10 @@ class AlertManager:
             except (OperationalError, DisconnectionError) as e:
                 if attempt < self.max_retries - 1:
                     logging.warning(f"数据库操作失败 (尝试 {attempt + 1}/{self.max_retries}): {e}")
-                    time.sleep(self.retry_delay)
+                    # 指数退避+随机抖动：短暂故障快速恢复，避免多个worker同步重试冲击数据库
+                    delay = self.retry_delay * (2 ** attempt) + random.uniform(0, self.retry_delay)
+                    time.sleep(min(delay, 30))
                     # 回滚会话
-                    from core.database import db
                     db.session.rollback()
                 else:
                     logging.error(f"数据库操作最终失败: {e}")
@@ -77,10 +138,9 @@ class AlertManager:
 
     def get_all_alerts(self, limit=None):
         """获取所有告警（包括已解决和未解决的）- 带重试机制"""
-        from core.database import db, Alert
 
         def _query_all_alerts():
-            query = Alert.query.order_by(Alert.timestamp.desc())
+            query = Alert.query.options(_LIST_COLUMNS).order_by(Alert.timestamp.desc())
             if limit:
                 query = query.limit(limit)
             return query.all()
@@ -94,37 +154,30 @@ class AlertManager:
         process_name = port_data.get('process_name', 'unknown').lower()
         state = port_data.get('state', '')
 
-        # 高风险进程检测
-        high_risk_processes = {'nc', 'ncat', 'telnet', 'ftp', 'tftp', 'ssh', 'rsh', 'rexec'}
-
-        # 检测可疑连接状态
-        suspicious_states = {'syn-sent', 'syn-recv', 'fin-wait-1', 'fin-wait-2', 'close-wait'}
+        # 查表确定端口自身的风险级别
+        if change_type == 'new':
+            port_level = self._new_level.get(port)
+        else:  # closed
+            port_level = self._closed_level.get(port)
 
         # 规则1: 高风险端口 + 新开启 = 严重告警
-        if change_type == 'new' and port in self.high_risk_ports:
+        if port_level == 'ERROR':
             return 'ERROR'
 
         # 规则2: 高风险进程 + 新开启 = 严重告警
-        if change_type == 'new' and any(proc in process_name for proc in high_risk_processes):
+        if change_type == 'new' and self._high_risk_proc_re.search(process_name):
             return 'ERROR'
 
         # 规则3: 可疑连接状态 = 警告
-        if state in suspicious_states:
+        if state in self.suspicious_states:
             return 'WARNING'
 
-        # 规则4: 中风险端口 + 新开启 = 警告
-        if change_type == 'new' and port in self.medium_risk_ports:
-            return 'WARNING'
-
-        # 规则5: 系统关键端口关闭 = 警告
-        if change_type == 'closed' and port in self.high_risk_ports:
+        # 规则4/5: 中风险端口新开启、关键端口关闭 = 警告
+        if port_level == 'WARNING':
             return 'WARNING'
 
         # 默认规则
-        if change_type == 'new':
-            return 'INFO'
-        else:  # closed
-            return 'INFO'
+        return 'INFO'
 
     def _generate_alert_message(self, port_data, change_type, level):
         """生成详细的告警消息"""
@@ -133,90 +186,136 @@ class AlertManager:
         state = port_data.get('state', '')
         protocol = port_data.get('protocol', 'tcp')
 
-        base_messages = {
-            'new': {
-                'ERROR': f"🚨 高风险端口开启 - 端口 {port}/{protocol} 被进程 {process_name} 打开",
-                'WARNING': f"⚠️ 端口异常开启 - 端口 {port}/{protocol} 被进程 {process_name} 打开",
-                'INFO': f"📝 端口开启 - 端口 {port}/{protocol} 被进程 {process_name} 打开"
-            },
-            'closed': {
-                'ERROR': f"🚨 关键端口关闭 - 端口 {port}/{protocol} 已关闭",
-                'WARNING': f"⚠️ 端口异常关闭 - 端口 {port}/{protocol} 已关闭",
-                'INFO': f"📝 端口关闭 - 端口 {port}/{protocol} 已关闭"
-            }
-        }
-
-        message = base_messages[change_type][level]
+        parts = [BASE_MESSAGES[change_type][level].format(
+            port=port, protocol=protocol, process_name=process_name)]
 
         # 添加额外信息
         if state and state != 'listening':
-            message += f" (状态: {state})"
+            parts.append(f" (状态: {state})")
 
         # 添加风险说明
         if level == 'ERROR':
             if port in self.high_risk_ports:
-                message += f" - 此端口({port})通常用于敏感服务"
-            elif any(proc in process_name.lower() for proc in {'nc', 'ncat', 'telnet'}):
-                message += f" - 检测到可疑网络工具({process_name})"
+                parts.append(f" - 此端口({port})通常用于敏感服务")
+            elif self._suspicious_tool_re.search(process_name.lower()):
+                parts.append(f" - 检测到可疑网络工具({process_name})")
+
+        # 一次join拼装，避免逐段+=产生中间字符串
+        return ''.join(parts)
+
+    def _is_duplicate_alert(self, port, change_type):
+        """检查(port, change_type)是否在去重窗口内已告警过"""
+        now = time.monotonic()
+        key = (port, change_type)
+
+        expires = self._recent_alerts.get(key)
+        if expires is not None and expires > now:
+            return True
+
+        # 惰性清理过期条目，保证字典有界
+        if len(self._recent_alerts) > 1024:
+            self._recent_alerts = {
+                k: v for k, v in self._recent_alerts.items() if v > now
+            }
 
-        return message
+        self._recent_alerts[key] = now + self._dedup_ttl
+        return False
+
+    def _build_alert_rows(self, changes):
+        """把端口变化整理成待插入的告警字典行（不触碰数据库）"""
+        # 轻量字典行走bulk_insert_mappings，完全绕开ORM逐对象簿记，
+        # 返回字典摘要给调用方，避免插入后的对象刷新
+        rows = []
+        # 整批告警共用一个UTC时间戳，与模型默认的utcnow保持一致
+        now_ts = datetime.utcnow()
+
+        # 新开/关闭两类变化的处理逻辑完全一致，chain合并成单循环统一处理
+        pending = chain(
+            ((p, 'new') for p in changes.get('new_ports', ())),
+            ((p, 'closed') for p in changes.get('closed_ports', ())))
+
+        for port_data, change_type in pending:
+            port = port_data['port']
+            # 忽略端口与去重窗口内的重复变化直接跳过，不做任何构造工作
+            if port in self._ignore_ports:
+                continue
+            if self._is_duplicate_alert(port, change_type):
+                continue
+            level = self._determine_alert_level(port_data, change_type)
+            message = self._generate_alert_message(port_data, change_type, level)
+
+            rows.append({
+                'level': level,
+                'title': '端口状态变化',
+                'message': message,
+                'port': port,
+                'timestamp': now_ts,
+                'resolved': False
+            })
+
+        return rows
+
+    def _insert_alert_rows(self, rows):
+        """批量落库一组告警行"""
+        db.session.bulk_insert_mappings(Alert, rows)
+        db.session.commit()
+        logging.info(f"生成 {len(rows)} 个告警，级别分布: "
+                     f"ERROR: {sum(1 for a in rows if a['level'] == 'ERROR')}, "
+                     f"WARNING: {sum(1 for a in rows if a['level'] == 'WARNING')}, "
+                     f"INFO: {sum(1 for a in rows if a['level'] == 'INFO')}")
+        return rows
+
+    def _writer_loop(self):
+        """告警写线程：攒满一批或等待刷新间隔后单次批量落库"""
+        while True:
+            # 阻塞等待首条，随后在刷新窗口内尽量多攒几条合并成一次插入
+            rows = [self._alert_queue.get()]
+            deadline = time.monotonic() + self._flush_interval
+            while len(rows) < self._max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    rows.append(self._alert_queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            # 任何异常都不能杀死写线程：重试耗尽后记录并丢弃这一批，
+            # 线程继续消费队列，否则告警只入队不落库且队列无界增长
+            try:
+                with self._app.app_context():
+                    self._db_operation_with_retry(self._insert_alert_rows, rows)
+            except Exception as e:
+                logging.error(f"告警批量落库失败，丢弃 {len(rows)} 条告警: {e}")
 
     def check_port_changes(self, changes):
-        """检查端口变化并生成分级告警 - 带重试机制"""
-        from core.database import db, Alert
-
-        def _create_alerts():
-            alerts = []
-
-            # 处理新端口
-            for port_data in changes.get('new_ports', []):
-                level = self._determine_alert_level(port_data, 'new')
-                message = self._generate_alert_message(port_data, 'new', level)
-
-                alert = Alert(
-                    level=level,
-                    title='端口状态变化',
-                    message=message,
-                    port=port_data['port'],
-                    timestamp=datetime.now(),
-                    resolved=False
-                )
-                db.session.add(alert)
-                alerts.append(alert)
-
-            # 处理关闭端口
-            for port_data in changes.get('closed_ports', []):
-                level = self._determine_alert_level(port_data, 'closed')
-                message = self._generate_alert_message(port_data, 'closed', level)
-
-                alert = Alert(
-                    level=level,
-                    title='端口状态变化',
-                    message=message,
-                    port=port_data['port'],
-                    timestamp=datetime.now(),
-                    resolved=False
-                )
-                db.session.add(alert)
-                alerts.append(alert)
-
-            if alerts:
-                db.session.commit()
-                logging.info(f"生成 {len(alerts)} 个告警，级别分布: "
-                             f"ERROR: {sum(1 for a in alerts if a.level == 'ERROR')}, "
-                             f"WARNING: {sum(1 for a in alerts if a.level == 'WARNING')}, "
-                             f"INFO: {sum(1 for a in alerts if a.level == 'INFO')}")
-
-            return alerts
-
-        return self._db_operation_with_retry(_create_alerts)
+        """检查端口变化并生成分级告警
+
+        绑定了app的实例走异步队列：行入队后立即返回，由写线程批量落库，
+        扫描循环不再阻塞在数据库提交上；未绑定app时保持同步插入（带重试）。
+        """
+        # 稳态扫描绝大多数轮次都没有任何变化，先零成本短路，
+        # 不做过滤/去重/建行等任何工作
+        if not changes.get('new_ports') and not changes.get('closed_ports'):
+            return []
+
+        rows = self._build_alert_rows(changes)
+        if not rows:
+            return []
+
+        if self._alert_queue is not None:
+            for row in rows:
+                self._alert_queue.put(row)
+            return rows
+
+        return self._db_operation_with_retry(self._insert_alert_rows, rows)
 
     def get_alerts(self, resolved=False, limit=None):
         """获取告警 - 带重试机制"""
-        from core.database import db, Alert
 
         def _query_alerts():
-            query = Alert.query.filter_by(resolved=resolved).order_by(Alert.timestamp.desc())
+            query = Alert.query.options(_LIST_COLUMNS).filter_by(
+                resolved=resolved).order_by(Alert.timestamp.desc())
             if limit:
                 query = query.limit(limit)
             return query.all()
@@ -225,38 +324,46 @@ class AlertManager:
 
     def resolve_alert(self, alert_id):
         """解决告警 - 带重试机制"""
-        from core.database import db, Alert
 
         def _resolve_alert():
-            alert = Alert.query.get(alert_id)
-            if alert:
-                alert.resolved = True
-                db.session.commit()
-                return True
-            return False
+            # 单条UPDATE直达，省去先SELECT整行再改写的往返和ORM物化
+            result = db.session.execute(
+                db.update(Alert).where(Alert.id == alert_id).values(resolved=True))
+            db.session.commit()
+            return result.rowcount > 0
 
         return self._db_operation_with_retry(_resolve_alert)
 
     def get_alert_stats(self, hours=24):
         """获取告警统计 - 带重试机制"""
-        from core.database import db, Alert
-        from datetime import datetime, timedelta
 
         def _get_stats():
-            since_time = datetime.now() - timedelta(hours=hours)
+            # 告警行以utcnow写入，统计窗口同样用UTC计算，
+            # 否则非UTC时区主机上"最近N小时"会被时区偏移截短
+            since_time = datetime.utcnow() - timedelta(hours=hours)
 
-            total = Alert.query.filter(Alert.timestamp >= since_time).count()
-            resolved = Alert.query.filter(Alert.timestamp >= since_time, Alert.resolved == True).count()
-            by_level = db.session.query(
+            # 单条SQL完成总数/已解决数/按级别统计，省去三次数据库往返
+            rows = db.session.query(
                 Alert.level,
+                Alert.resolved,
                 db.func.count(Alert.id)
-            ).filter(Alert.timestamp >= since_time).group_by(Alert.level).all()
+            ).filter(Alert.timestamp >= since_time).group_by(
+                Alert.level, Alert.resolved).all()
+
+            total = 0
+            resolved = 0
+            by_level = {}
+            for level, is_resolved, count in rows:
+                total += count
+                if is_resolved:
+                    resolved += count
+                by_level[level] = by_level.get(level, 0) + count
 
             return {
                 'total': total,
                 'resolved': resolved,
                 'unresolved': total - resolved,
-                'by_level': dict(by_level)
+                'by_level': by_level
             }
 
         return self._db_operation_with_retry(_get_stats) or {
@@ -268,7 +375,6 @@ class AlertManager:
 
     def add_custom_alert(self, level, title, message, port=None):
         """添加自定义告警"""
-        from core.database import db, Alert
 
         def _create_custom_alert():
             alert = Alert(
@@ -276,7 +382,7 @@ class AlertManager:
                 title=title,
                 message=message,
                 port=port,
-                timestamp=datetime.now(),
+                timestamp=datetime.utcnow(),
                 resolved=False
             )
             db.session.add(alert)
@@ -1,7 +1,9 @@
 # database.py
 from datetime import datetime
+from flask import has_app_context
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from sqlalchemy.exc import DisconnectionError, OperationalError
 import time
 import logging
@@ -9,8 +11,28 @@ import logging
 db = SQLAlchemy()
 
 
+@event.listens_for(Engine, 'connect')
+def _set_sqlite_pragmas(dbapi_conn, connection_record):
+    """
+    SQLite部署（开发/单机场景）开启WAL并放宽同步级别：
+    WAL消除写阻塞读的锁竞争，NORMAL省去每次commit的fsync停顿。
+    按驱动判断，生产环境的MySQL/Postgres连接不受影响。
+    """
+    if type(dbapi_conn).__module__.split('.')[0] != 'sqlite3':
+        return
+    cursor = dbapi_conn.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.close()
+
+
 class PortStatus(db.Model):
     __tablename__ = 'port_status'
+    # 端口历史按(端口, 协议)过滤并按时间检索，复合索引避免全表扫描
+    __table_args__ = (
+        db.Index('ix_port_status_port_proto_ts', 'port', 'protocol', 'timestamp'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     port = db.Column(db.Integer, nullable=False)
@@ -38,6 +60,11 @@ class PortStatus(db.Model):
 
 class Alert(db.Model):
     __tablename__ = 'alerts'
+    # 告警查询都按 resolved + timestamp 过滤并按时间倒序，复合索引直接覆盖
+    __table_args__ = (
+        db.Index('ix_alert_resolved_ts', 'resolved', 'timestamp'),
+        db.Index('ix_alert_ts', 'timestamp'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     level = db.Column(db.String(20), nullable=False)  # INFO, WARNING, ERROR
@@ -68,10 +95,17 @@ class DatabaseManager:
 
     def execute_with_retry(self, operation, *args, **kwargs):
         """带重试机制的数据库操作"""
+        # 已在应用上下文内时直接重试，避免重复push/pop上下文栈
+        if has_app_context():
+            return self._retry_loop(operation, *args, **kwargs)
+        with self.app.app_context():
+            return self._retry_loop(operation, *args, **kwargs)
+
+    def _retry_loop(self, operation, *args, **kwargs):
+        """在当前应用上下文内执行操作并按需重试"""
         for attempt in range(self.max_retries):
             try:
-                with self.app.app_context():
-                    return operation(*args, **kwargs)
+                return operation(*args, **kwargs)
             except (OperationalError, DisconnectionError) as e:
                 if attempt < self.max_retries - 1:
                     logging.warning(f"数据库操作失败 (尝试 {attempt + 1}/{self.max_retries}): {e}")
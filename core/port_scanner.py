@@ -1,9 +1,41 @@
+import os
+import struct
 import subprocess
 import json
 import psutil
+from collections import namedtuple
 from datetime import datetime
+from functools import lru_cache
 import socket
 
+# 协议名→小整数映射：差异检测的字典键用(port, proto_id)元组，
+# 元组哈希比每条记录格式化"端口-协议"字符串快一个数量级
+PROTO_ID = {'TCP': 1, 'UDP': 2, 'UNKNOWN': 0}
+
+
+class PortRecord(namedtuple('PortRecord', [
+        'port', 'protocol', 'state', 'pid', 'process_name', 'user',
+        'cmdline', 'exec_path', 'start_time', 'timestamp',
+        'local_address', 'remote_address'])):
+    """
+    紧凑的端口记录结构：相比12键字典省~3倍内存，属性访问免哈希查找；
+    仅在scan_ports/get_port_detail的对外边界转成字典
+    """
+    __slots__ = ()
+
+    @property
+    def key(self):
+        """差异检测用的(端口, 协议id)整数元组键"""
+        return (self.port, PROTO_ID.get(self.protocol, 0))
+
+# /proc/net/tcp中的十六进制连接状态码 → 可读状态名
+PROC_TCP_STATES = {
+    '01': 'ESTABLISHED', '02': 'SYN_SENT', '03': 'SYN_RECV',
+    '04': 'FIN_WAIT1', '05': 'FIN_WAIT2', '06': 'TIME_WAIT',
+    '07': 'CLOSE', '08': 'CLOSE_WAIT', '09': 'LAST_ACK',
+    '0A': 'LISTEN', '0B': 'CLOSING'
+}
+
 
 class PortScanner:
     """
@@ -20,16 +52,100 @@ class PortScanner:
         """
         self.config = config  # 存储配置信息
         self.last_scan_result = {}  # 存储上一次扫描结果，用于比较变化
+        # 格式化进程信息缓存：(pid, create_time)为键，跨扫描复用；
+        # create_time区分pid复用，长驻进程集稳定时命中率极高
+        self._proc_fmt_cache = {}
+
+    @staticmethod
+    def _parse_proc_net_addr(addr_hex):
+        """
+        解析/proc/net/*中十六进制表示的"地址:端口"字段
+
+        Args:
+            addr_hex (str): 形如"0100007F:1F90"的十六进制地址
+
+        Returns:
+            tuple: (ip字符串, 端口号int)
+        """
+        ip_hex, port_hex = addr_hex.rsplit(':', 1)
+        port = int(port_hex, 16)
+
+        if len(ip_hex) == 8:
+            # IPv4：单个32位小端整数
+            ip = socket.inet_ntoa(struct.pack('<I', int(ip_hex, 16)))
+        else:
+            # IPv6：4个32位小端整数
+            packed = struct.pack(
+                '<4I', *(int(ip_hex[i:i + 8], 16) for i in range(0, 32, 8)))
+            ip = socket.inet_ntop(socket.AF_INET6, packed)
+
+        return ip, port
+
+    def _read_proc_net(self, proto):
+        """
+        直接解析/proc/net/{proto}获取连接信息（无需fork子进程）
+
+        Args:
+            proto (str): 协议文件名，如'tcp'、'tcp6'、'udp'、'udp6'
+
+        Returns:
+            list: 连接信息字典列表，每项含proto/local_address/state/inode
+        """
+        connections = []
+        try:
+            with open(f'/proc/net/{proto}', 'rb') as f:
+                lines = f.read().splitlines()[1:]  # 跳过表头
+        except OSError:
+            return connections
+
+        for line in lines:
+            fields = line.split()
+            if len(fields) < 10:
+                continue
+            try:
+                ip, port = self._parse_proc_net_addr(fields[1].decode())
+                state_hex = fields[3].decode().upper()
+                connections.append({
+                    'proto': proto,
+                    'local_address': f"{ip}:{port}",
+                    'port': port,
+                    'state': PROC_TCP_STATES.get(state_hex, state_hex),
+                    'inode': int(fields[9])
+                })
+            except (ValueError, OSError):
+                continue  # 跳过无法解析的行
+
+        return connections
+
+    def get_proc_net_info(self):
+        """
+        汇总解析/proc/net下的TCP/UDP连接表
+
+        Returns:
+            list: 所有协议的连接信息字典列表
+        """
+        connections = []
+        for proto in ('tcp', 'tcp6', 'udp', 'udp6'):
+            connections.extend(self._read_proc_net(proto))
+        return connections
 
     def get_netstat_info(self):
         """
-        使用netstat命令获取网络连接信息
+        获取网络连接信息文本
+
+        Linux上直接解析/proc/net（netstat数据的同一来源），
+        避免每次调用fork+exec子进程；其他平台回退到netstat命令。
 
         Returns:
-            str: netstat命令输出的字符串结果，包含TCP/UDP连接信息
+            str: 每行一条连接记录的文本
         """
+        if os.path.exists('/proc/net/tcp'):
+            return '\n'.join(
+                f"{c['proto']} {c['local_address']} {c['state']} inode={c['inode']}"
+                for c in self.get_proc_net_info())
+
         try:
-            # 执行netstat命令，参数说明：
+            # 回退：执行netstat命令，参数说明：
             # -t: 显示TCP连接
             # -u: 显示UDP连接
             # -l: 仅显示监听状态的连接
@@ -55,31 +171,37 @@ class PortScanner:
             dict: 包含端口详细信息的字典，如果端口不存在则返回空字典
         """
         try:
-            # 获取当前所有端口信息
-            current_ports = self.parse_port_info()
+            # 优先命中上次扫描结果，O(1)字典探测，无需任何系统调用
+            for proto_id in (PROTO_ID['TCP'], PROTO_ID['UDP'], PROTO_ID['UNKNOWN']):
+                port_data = self.last_scan_result.get((port, proto_id))
+                if port_data:
+                    return port_data._asdict()
 
-            # 查找指定端口的信息
-            port_details = []
-            for port_data in current_ports:
-                if port_data['port'] == port:
-                    port_details.append(port_data)
-
-            if not port_details:
-                return {}
+            # 未命中时只针对目标端口做定向查找，避免全量端口扫描
+            for conn in psutil.net_connections(kind='inet'):
+                if conn.laddr and conn.laddr.port == port:
+                    process_info = self.get_process_info(conn.pid) if conn.pid else {}
+                    if process_info.get('name', 'unknown') == 'unknown':
+                        continue  # 跳过未知进程
+                    return self._build_port_data(conn, process_info)._asdict()
 
-            # 返回第一个匹配的端口信息（通常一个端口只有一个进程在使用）
-            return port_details[0]
+            return {}
 
         except Exception as e:
             print(f"Error getting port detail for {port}: {e}")
             return {}
     def get_ss_info(self):
         """
-        使用ss命令获取更详细的端口信息（ss是netstat的现代替代工具）
+        获取端口信息文本（ss是netstat的现代替代工具）
+
+        Linux上与get_netstat_info一样直接解析/proc/net，免去fork开销。
 
         Returns:
-            str: ss命令输出的字符串结果
+            str: ss命令输出或/proc解析结果的字符串
         """
+        if os.path.exists('/proc/net/tcp'):
+            return self.get_netstat_info()
+
         try:
             # 执行ss命令，参数说明：
             # -t: TCP连接
@@ -113,52 +235,106 @@ class PortScanner:
         """
         port_info = []  # 存储解析后的端口信息
 
+        # 每次扫描只格式化一次时间戳，所有记录复用同一字符串
+        now_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
         # 方法1: 使用psutil库获取网络连接信息（跨平台兼容性更好）
         try:
+            # 一次process_iter预取全部进程属性，多个连接共享同一pid时
+            # 不再重复读取/proc（每个连接单独构造psutil.Process要做多次系统调用）
+            proc_map = {
+                proc.info['pid']: proc.info
+                for proc in psutil.process_iter(
+                    ['pid', 'name', 'username', 'cmdline', 'exe', 'create_time'])
+            }
+
             # 获取所有inet类型的网络连接（IPv4和IPv6）
             for conn in psutil.net_connections(kind='inet'):
                 if conn.laddr:  # 只处理有本地地址的连接（过滤掉只有远程地址的连接）
                     port = conn.laddr.port  # 本地端口号
                     pid = conn.pid  # 进程ID
 
-                    # 如果存在进程ID，则获取进程详细信息
-                    process_info = self.get_process_info(pid) if pid else {}
+                    # 如果存在进程ID，则从预取表中获取进程详细信息
+                    raw_info = proc_map.get(pid) if pid else None
+                    process_info = self._format_process_info(raw_info) if raw_info else {}
 
                     # 过滤掉进程名未知的进程，避免显示无效信息
-                    process_name = process_info.get('name', 'unknown')
-                    if process_name == 'unknown':
+                    if process_info.get('name', 'unknown') == 'unknown':
                         continue  # 跳过未知进程
 
-                    # 根据socket类型确定协议类型
-                    if conn.type == socket.SOCK_STREAM:
-                        protocol = 'TCP'  # 面向连接的TCP协议
-                    elif conn.type == socket.SOCK_DGRAM:
-                        protocol = 'UDP'  # 无连接的UDP协议
-                    else:
-                        protocol = 'UNKNOWN'  # 其他未知协议类型
-
-                    # 构建端口信息字典
-                    port_data = {
-                        'port': port,  # 端口号
-                        'protocol': protocol,  # 协议类型（TCP/UDP）
-                        'state': conn.status,  # 连接状态（LISTEN, ESTABLISHED等）
-                        'pid': pid,  # 进程ID
-                        'process_name': process_name,  # 进程名称
-                        'user': process_info.get('username', 'unknown'),  # 进程所属用户
-                        'cmdline': process_info.get('cmdline', ''),  # 进程启动命令
-                        'exec_path': process_info.get('exe', ''),  # 进程可执行文件路径
-                        'start_time': process_info.get('create_time', ''),  # 进程启动时间
-                        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),  # 当前扫描时间戳
-                        'local_address': f"{conn.laddr.ip}:{conn.laddr.port}",  # 本地地址:端口
-                        'remote_address': f"{conn.raddr.ip}:{conn.raddr.port}" if conn.raddr else ""  # 远程地址:端口（如果有）
-                    }
-
-                    port_info.append(port_data)  # 添加到结果列表
+                    port_info.append(self._build_port_data(conn, process_info, now_str))
         except Exception as e:
             print(f"Psutil error: {e}")  # 输出psutil相关错误
 
         return port_info
 
+    def _build_port_data(self, conn, process_info, now_str=None):
+        """
+        由单个连接对象和进程信息构建端口信息字典
+
+        Args:
+            conn: psutil连接对象（需有laddr）
+            process_info (dict): 进程详细信息字典
+            now_str (str): 预格式化的扫描时间戳，未提供时现场生成
+
+        Returns:
+            PortRecord: 端口信息记录
+        """
+        if now_str is None:
+            now_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        # 根据socket类型确定协议类型
+        if conn.type == socket.SOCK_STREAM:
+            protocol = 'TCP'  # 面向连接的TCP协议
+        elif conn.type == socket.SOCK_DGRAM:
+            protocol = 'UDP'  # 无连接的UDP协议
+        else:
+            protocol = 'UNKNOWN'  # 其他未知协议类型
+
+        return PortRecord(
+            port=conn.laddr.port,  # 端口号
+            protocol=protocol,  # 协议类型（TCP/UDP）
+            state=conn.status,  # 连接状态（LISTEN, ESTABLISHED等）
+            pid=conn.pid,  # 进程ID
+            process_name=process_info.get('name', 'unknown'),  # 进程名称
+            user=process_info.get('username', 'unknown'),  # 进程所属用户
+            cmdline=process_info.get('cmdline', ''),  # 进程启动命令
+            exec_path=process_info.get('exe', ''),  # 进程可执行文件路径
+            start_time=process_info.get('create_time', ''),  # 进程启动时间
+            timestamp=now_str,  # 当前扫描时间戳
+            local_address=f"{conn.laddr.ip}:{conn.laddr.port}",  # 本地地址:端口
+            remote_address=f"{conn.raddr.ip}:{conn.raddr.port}" if conn.raddr else ""  # 远程地址:端口（如果有）
+        )
+
+    def _format_process_info(self, info):
+        """
+        把process_iter预取的属性字典整理成端口记录所需的形状
+
+        Args:
+            info (dict): psutil.process_iter返回的proc.info字典
+
+        Returns:
+            dict: 与get_process_info相同结构的进程信息字典
+        """
+        create_time = info.get('create_time')
+        cache_key = (info.get('pid'), create_time)
+        cached = self._proc_fmt_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        result = {
+            'name': info.get('name') or 'unknown',
+            'username': info.get('username') or 'unknown',
+            'cmdline': ' '.join(info.get('cmdline') or []),
+            'exe': info.get('exe') or '',
+            'create_time': datetime.fromtimestamp(create_time).strftime(
+                '%Y-%m-%d %H:%M:%S') if create_time else ''
+        }
+        # 简单有界：超限整体清空，下一轮扫描重新填充
+        if len(self._proc_fmt_cache) > 4096:
+            self._proc_fmt_cache.clear()
+        self._proc_fmt_cache[cache_key] = result
+        return result
+
     def get_process_info(self, pid):
         """
         根据进程ID获取进程的详细信息
@@ -169,6 +345,31 @@ class PortScanner:
         Returns:
             dict: 包含进程详细信息的字典，如果进程不存在或无法访问则返回空字典
         """
+        try:
+            # 廉价探针：只取create_time确认进程存活并区分pid复用
+            create_time = psutil.Process(pid).create_time()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            # 处理进程不存在或无权限访问的情况
+            return {}
+
+        return self._fetch_process_info(pid, create_time)
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _fetch_process_info(pid, create_time):
+        """
+        获取并缓存进程详细信息
+
+        以(pid, create_time)为缓存键：同一长驻进程跨多次扫描只做一次
+        完整的psutil属性读取，pid被复用时create_time变化自动失效。
+
+        Args:
+            pid (int): 进程ID
+            create_time (float): 进程创建时间戳（缓存键的一部分）
+
+        Returns:
+            dict: 包含进程详细信息的字典，进程消失时返回空字典
+        """
         try:
             # 通过psutil获取进程对象
             process = psutil.Process(pid)
@@ -178,11 +379,11 @@ class PortScanner:
                 'cmdline': ' '.join(process.cmdline()),  # 进程启动命令（合并为字符串）
                 'exe': process.exe(),  # 进程可执行文件完整路径
                 'create_time': datetime.fromtimestamp(
-                    process.create_time()
-                ).strftime('%Y-%m-%d %H:%M:%S') if process.create_time() else ''  # 进程启动时间（格式化）
+                    create_time
+                ).strftime('%Y-%m-%d %H:%M:%S') if create_time else ''  # 进程启动时间（格式化）
             }
         except (psutil.NoSuchProcess, psutil.AccessDenied):
-            # 处理进程不存在或无权限访问的情况
+            # 进程在探针和读取之间消失
             return {}
 
     def scan_ports(self):
@@ -196,12 +397,20 @@ class PortScanner:
         current_scan = self.parse_port_info()
         # 检测与上一次扫描的变化
         changes = self.detect_changes(current_scan)
-        # 更新上一次扫描结果，使用端口-协议作为唯一键
-        self.last_scan_result = {f"{p['port']}-{p['protocol']}": p for p in current_scan}
+        # 更新上一次扫描结果，使用(端口, 协议id)元组作为唯一键
+        self.last_scan_result = {p.key: p for p in current_scan}
 
+        # 对外边界统一转成字典，内部始终以紧凑的PortRecord流转
         return {
-            'current_ports': current_scan,  # 当前所有端口信息
-            'changes': changes,  # 端口变化信息
+            'current_ports': [p._asdict() for p in current_scan],  # 当前所有端口信息
+            'changes': {
+                'new_ports': [p._asdict() for p in changes['new_ports']],
+                'closed_ports': [p._asdict() for p in changes['closed_ports']],
+                'changed_ports': [{
+                    'port_data': c['port_data']._asdict(),
+                    'previous_state': c['previous_state']._asdict()
+                } for c in changes['changed_ports']]
+            },  # 端口变化信息
             'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')  # 扫描完成时间戳
         }
 
@@ -224,31 +433,31 @@ class PortScanner:
             'changed_ports': []  # 状态发生变化的端口
         }
 
-        # 将当前扫描结果转换为字典格式，键为"端口-协议"
-        current_dict = {f"{p['port']}-{p['protocol']}": p for p in current_scan}
+        # 将当前扫描结果转换为字典格式，键为(端口, 协议id)元组
+        current_dict = {p.key: p for p in current_scan}
         # 上一次扫描结果字典
         last_dict = self.last_scan_result
 
-        # 检测新端口：在当前扫描中存在但在上一次扫描中不存在的端口
-        for key, port_data in current_dict.items():
-            if key not in last_dict:
-                changes['new_ports'].append(port_data)
-
-        # 检测关闭的端口：在上一次扫描中存在但在当前扫描中不存在的端口
-        for key, port_data in last_dict.items():
-            if key not in current_dict:
-                changes['closed_ports'].append(port_data)
-
-        # 检测状态变化的端口：端口存在但状态或进程ID发生变化
-        for key, current_data in current_dict.items():
-            if key in last_dict:
-                last_data = last_dict[key]
-                # 检查连接状态或进程ID是否发生变化
-                if (current_data['state'] != last_data['state'] or
-                        current_data['pid'] != last_data['pid']):
-                    changes['changed_ports'].append({
-                        'port_data': current_data,  # 当前端口数据
-                        'previous_state': last_data  # 上一次的端口数据
-                    })
+        # 用字典视图的集合差运算检测新增/关闭端口（C层实现，O(N+M)）
+        current_keys = current_dict.keys()
+        last_keys = last_dict.keys()
+
+        # 新端口：在当前扫描中存在但在上一次扫描中不存在的端口
+        changes['new_ports'] = [current_dict[key] for key in current_keys - last_keys]
+
+        # 关闭的端口：在上一次扫描中存在但在当前扫描中不存在的端口
+        changes['closed_ports'] = [last_dict[key] for key in last_keys - current_keys]
+
+        # 检测状态变化的端口：只遍历两次扫描共有的键（集合交集，C层实现），
+        # 状态和进程ID合并为一次元组比较
+        for key in current_keys & last_keys:
+            current_data = current_dict[key]
+            last_data = last_dict[key]
+            if ((current_data.state, current_data.pid) !=
+                    (last_data.state, last_data.pid)):
+                changes['changed_ports'].append({
+                    'port_data': current_data,  # 当前端口数据
+                    'previous_state': last_data  # 上一次的端口数据
+                })
 
         return changes
\ No newline at end of file
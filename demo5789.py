@@ -36,9 +36,17 @@ def submit_data():
         "data": {"received": True}
     })
 
+# 生产部署请使用多进程WSGI服务器（Werkzeug开发服务器单线程串行处理请求）：
+#   gunicorn -w 4 -k gthread --threads 4 -b 0.0.0.0:5789 demo5789:app
 if __name__ == "__main__":
-    app.run(
-        host="0.0.0.0",
-        port=5789,
-        debug=True
-    )
\ No newline at end of file
+    try:
+        # Windows等无gunicorn的平台回退到waitress（多线程WSGI服务器）
+        from waitress import serve
+        serve(app, host="0.0.0.0", port=5789, threads=8)
+    except ImportError:
+        # 最后兜底：仅限本地调试使用，务必保持debug关闭
+        app.run(
+            host="0.0.0.0",
+            port=5789,
+            debug=False
+        )
\ No newline at end of file
@@ -63,7 +63,7 @@ def test_alert_generation():
         if alerts:
             print(f"成功生成 {len(alerts)} 个告警:")
             for alert in alerts:
-                print(f"  - [{alert.level}] {alert.message}")
+                print(f"  - [{alert['level']}] {alert['message']}")
         else:
             print("未生成任何告警，请检查告警规则")
 
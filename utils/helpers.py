@@ -1,125 +1,291 @@
+import csv
+import io
 import psutil
+import re
 import subprocess
 import json
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
+import errno
 import socket
 import os
+import time
+import threading
 import logging
+from functools import lru_cache
 from typing import Dict, List, Optional, Any
 
-# 配置日志
-logging.basicConfig(level=logging.INFO)
+# orjson（C实现）序列化比stdlib json快数倍，且直接输出UTF-8，
+# 中文字符串不走逐字符转义扫描；未安装时回退到stdlib
+try:
+    import orjson
+
+    def _json_dumps(data: Any) -> str:
+        return orjson.dumps(
+            data, option=orjson.OPT_INDENT_2, default=str).decode()
+except ImportError:
+    def _json_dumps(data: Any) -> str:
+        return json.dumps(data, indent=2, ensure_ascii=False, default=str)
+
+# 日志配置由应用入口（create_app）统一负责，工具模块只取logger，
+# 避免导入副作用改写根logger导致重复输出
 logger = logging.getLogger(__name__)
 
+# 进程树索引缓存：get_process_tree未显式传索引时1秒内复用
+_PROC_INDEX_CACHE = {'t': 0.0, 'v': None}
+
+# net_connections快照缓存：psutil.net_connections要完整走一遍内核连接表
+# （Linux上解析/proc/net/tcp*），同一监控周期内多个检查共享一份快照
+_NC_CACHE = {'t': 0.0, 'v': []}
+
+
+def _cached_net_connections(ttl: float = 1.0) -> List[Any]:
+    """获取inet连接快照，TTL窗口内复用上次结果"""
+    now = time.monotonic()
+    if now - _NC_CACHE['t'] >= ttl:
+        _NC_CACHE['v'] = psutil.net_connections(kind='inet')
+        _NC_CACHE['t'] = now
+    return _NC_CACHE['v']
+
+
+# 导入时预热CPU计数器，此后interval=None的调用非阻塞返回
+# 自上次调用以来的使用率（调用间隔短于~100ms时数值意义不大）
+psutil.cpu_percent(interval=None)
+
+# 进程生命周期内不变的系统常量，导入时取一次
+_CPU_COUNT = psutil.cpu_count()
+_BOOT_TIME = psutil.boot_time()
+
 class SystemHelper:
     """系统助手类"""
     
+    @staticmethod
+    @lru_cache(maxsize=1)
+    def _static_host_info() -> Dict[str, str]:
+        """获取进程生命周期内不变的主机信息（只查一次）
+
+        gethostbyname可能阻塞在DNS解析上（几十毫秒到秒级），
+        os.uname是系统调用；这些在进程存活期间都不会变化。
+        """
+        hostname = socket.gethostname()
+        try:
+            ip_address = socket.gethostbyname(hostname)
+        except OSError:
+            # 主机名无法解析时回退到回环地址
+            ip_address = '127.0.0.1'
+        uname = os.uname()
+        return {
+            'hostname': hostname,
+            'ip_address': ip_address,
+            'platform': uname.sysname,
+            'release': uname.release
+        }
+
     @staticmethod
     def get_host_info() -> Dict[str, Any]:
         """获取主机信息"""
         try:
-            hostname = socket.gethostname()
-            return {
-                'hostname': hostname,
-                'ip_address': socket.gethostbyname(hostname),
-                'platform': os.uname().sysname,
-                'release': os.uname().release,
-                'timestamp': datetime.now().isoformat()
-            }
+            info = dict(SystemHelper._static_host_info())
+            info['timestamp'] = datetime.now().isoformat()
+            return info
         except Exception as e:
             logger.error(f"获取主机信息失败: {e}")
             return {}
     
     @staticmethod
     def is_port_in_use(port: int, protocol: str = 'tcp') -> bool:
-        """检查端口是否被占用"""
+        """检查端口是否被占用
+
+        用bind探测替代connect_ex：空闲端口立即返回（免去1秒超时等待），
+        也不会向目标端口发送真实连接；EADDRINUSE即表示端口被占用。
+        """
+        sock_type = socket.SOCK_DGRAM if protocol.lower() == 'udp' else socket.SOCK_STREAM
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(1)
-                result = s.connect_ex(('localhost', port))
-                return result == 0
+            with socket.socket(socket.AF_INET, sock_type) as s:
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                try:
+                    s.bind(('127.0.0.1', port))
+                    return False
+                except OSError as e:
+                    return e.errno == errno.EADDRINUSE
         except Exception as e:
             logger.error(f"检查端口 {port} 失败: {e}")
             return False
     
     @staticmethod
-    def get_process_tree(pid: int) -> Dict[str, Any]:
-        """获取进程树信息"""
+    def build_process_index() -> Dict[str, Any]:
+        """一趟process_iter构建进程树索引
+
+        psutil的children()每次都要全量扫/proc匹配ppid（O(进程总数)），
+        批量查询进程树时先建一次pid→信息、ppid→子进程列表的索引，
+        之后每个pid的查询都是O(1)字典探测。
+        """
+        by_pid: Dict[int, Dict[str, Any]] = {}
+        children: Dict[int, List[int]] = defaultdict(list)
+        for proc in psutil.process_iter(['pid', 'ppid', 'name']):
+            info = proc.info
+            by_pid[info['pid']] = info
+            children[info['ppid']].append(info['pid'])
+        return {'by_pid': by_pid, 'children': children}
+
+    @staticmethod
+    def get_process_tree(pid: int, index: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """获取进程树信息
+
+        Args:
+            pid: 目标进程ID
+            index: build_process_index()的结果；批量查询时传入复用，
+                   不传时使用1秒TTL的模块级缓存索引
+        """
         try:
-            process = psutil.Process(pid)
-            parent = process.parent()
-            
+            if index is None:
+                now = time.monotonic()
+                if now - _PROC_INDEX_CACHE['t'] >= 1.0:
+                    _PROC_INDEX_CACHE['v'] = SystemHelper.build_process_index()
+                    _PROC_INDEX_CACHE['t'] = now
+                index = _PROC_INDEX_CACHE['v']
+
+            info = index['by_pid'].get(pid)
+            if info is None:
+                return {}
+            parent = index['by_pid'].get(info['ppid'])
             return {
                 'pid': pid,
-                'name': process.name(),
-                'parent_pid': parent.pid if parent else None,
-                'parent_name': parent.name() if parent else None,
-                'children': [child.pid for child in process.children()]
+                'name': info['name'],
+                'parent_pid': parent['pid'] if parent else None,
+                'parent_name': parent['name'] if parent else None,
+                'children': list(index['children'].get(pid, ()))
             }
-        except psutil.NoSuchProcess:
+        except Exception as e:
+            logger.error(f"获取进程树失败: {e}")
             return {}
     
     @staticmethod
     def get_network_connections() -> List[Dict[str, Any]]:
         """获取网络连接信息"""
-        connections = []
         try:
-            for conn in psutil.net_connections(kind='inet'):
-                if conn.laddr:
-                    conn_info = {
-                        'fd': conn.fd,
-                        'family': conn.family.name,
-                        'type': conn.type.name,
-                        'laddr': f"{conn.laddr.ip}:{conn.laddr.port}",
-                        'raddr': f"{conn.raddr.ip}:{conn.raddr.port}" if conn.raddr else None,
-                        'status': conn.status,
-                        'pid': conn.pid
-                    }
-                    connections.append(conn_info)
+            # 列表推导式一次构建（C层LIST_APPEND），共享TTL快照
+            return [{
+                'fd': c.fd,
+                'family': c.family.name,
+                'type': c.type.name,
+                'laddr': f"{c.laddr.ip}:{c.laddr.port}",
+                'raddr': f"{c.raddr.ip}:{c.raddr.port}" if c.raddr else None,
+                'status': c.status,
+                'pid': c.pid
+            } for c in _cached_net_connections() if c.laddr]
         except Exception as e:
             logger.error(f"获取网络连接失败: {e}")
-        
-        return connections
+            return []
+
+# 端口/用户判定常量：模块加载时构建一次的frozenset，成员判断O(1)，
+# 风险分析、统计和未授权检查共用同一份
+_HIGH_RISK_PORTS = frozenset({21, 23, 135, 139, 445, 1433, 3306, 3389, 5432})
+_MONGO_EXCEPT = frozenset({27017, 28017})  # MongoDB 端口例外
+_COMMON_PORTS = frozenset({22, 80, 443, 3306, 5432})
+_PRIV_USERS = frozenset({'root', 'Administrator'})
+
+
+@dataclass(slots=True)
+class PortBatch:
+    """端口记录的列式（SoA）容器
+
+    字典列表按字段拆成平行列表后，协议/状态/进程分布统计可以走
+    list.count/Counter/map这类C层整列操作，批量分析不再逐条做字典查找。
+    """
+    ports: List[int] = field(default_factory=list)
+    protocols: List[str] = field(default_factory=list)
+    states: List[str] = field(default_factory=list)
+    pids: List[Optional[int]] = field(default_factory=list)
+    process_names: List[str] = field(default_factory=list)
+    users: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_dicts(cls, ports: List[Dict[str, Any]]) -> 'PortBatch':
+        """从字典列表一次性装入各列"""
+        batch = cls()
+        for p in ports:
+            batch.ports.append(p.get('port', 0))
+            batch.protocols.append(p.get('protocol', ''))
+            batch.states.append(p.get('state', ''))
+            batch.pids.append(p.get('pid'))
+            batch.process_names.append(p.get('process_name', 'unknown'))
+            batch.users.append(p.get('user', 'unknown'))
+        return batch
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """转回字典列表（对外API边界用）"""
+        return [{
+            'port': port, 'protocol': protocol, 'state': state,
+            'pid': pid, 'process_name': process_name, 'user': user
+        } for port, protocol, state, pid, process_name, user in zip(
+            self.ports, self.protocols, self.states,
+            self.pids, self.process_names, self.users)]
+
+    def statistics(self) -> Dict[str, Any]:
+        """整列统计，结果形状与PortAnalyzer.get_port_statistics一致"""
+        if not self.ports:
+            return {}
+        return {
+            'total_ports': len(self.ports),
+            'tcp_ports': self.protocols.count('TCP'),
+            'udp_ports': self.protocols.count('UDP'),
+            'listening_ports': self.states.count('LISTEN'),
+            'process_distribution': dict(Counter(self.process_names)),
+            'user_distribution': dict(Counter(self.users)),
+            'common_ports': sum(map(_COMMON_PORTS.__contains__, self.ports))
+        }
+
 
 class PortAnalyzer:
     """端口分析器"""
-    
+
     @staticmethod
     def analyze_port_risk(port_data: Dict[str, Any]) -> Dict[str, Any]:
         """分析端口风险"""
         risk_level = "low"
         warnings = []
-        
+
         port = port_data.get('port', 0)
         process_name = port_data.get('process_name', '').lower()
         user = port_data.get('user', '')
-        
+
         # 高风险端口检测
-        high_risk_ports = [21, 23, 135, 139, 445, 1433, 3306, 3389, 5432]
-        if port in high_risk_ports:
+        if port in _HIGH_RISK_PORTS:
             risk_level = "high"
             warnings.append(f"端口 {port} 是常见服务端口，需关注安全性")
-        
+
         # 高权限用户检测
-        if user in ['root', 'Administrator']:
+        if user in _PRIV_USERS:
             risk_level = "high" if risk_level != "high" else risk_level
             warnings.append(f"进程以高权限用户 {user} 运行")
-        
+
         # 未知进程检测
         if not process_name or process_name in ['unknown', '']:
             risk_level = "high"
             warnings.append("未知进程监听端口")
-        
+
         # 非标准端口检测
-        if port > 10000 and port not in [27017, 28017]:  # MongoDB 端口例外
+        if port > 10000 and port not in _MONGO_EXCEPT:
             risk_level = "medium" if risk_level == "low" else risk_level
             warnings.append(f"端口 {port} 是非标准端口")
-        
+
         return {
             'risk_level': risk_level,
             'warnings': warnings,
             'score': PortAnalyzer._calculate_risk_score(risk_level, len(warnings))
         }
+
+    @staticmethod
+    def analyze_ports_bulk(ports: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """批量分析端口风险
+
+        批量路径把方法/常量查找绑定到局部变量后单循环处理，
+        扫描结果整批评分时比逐个调用省一截解释器开销。
+        """
+        analyze = PortAnalyzer.analyze_port_risk
+        return [analyze(p) for p in ports]
     
     @staticmethod
     def _calculate_risk_score(risk_level: str, warning_count: int) -> int:
@@ -132,143 +298,182 @@ class PortAnalyzer:
         """获取端口统计信息"""
         if not ports:
             return {}
-        
-        total_ports = len(ports)
-        tcp_ports = len([p for p in ports if p.get('protocol') == 'TCP'])
-        udp_ports = len([p for p in ports if p.get('protocol') == 'UDP'])
-        listening_ports = len([p for p in ports if p.get('state') == 'LISTEN'])
-        
-        # 按进程统计
-        process_stats = {}
-        for port in ports:
-            process_name = port.get('process_name', 'unknown')
-            if process_name not in process_stats:
-                process_stats[process_name] = 0
-            process_stats[process_name] += 1
-        
-        # 按用户统计
-        user_stats = {}
+
+        # 单次遍历完成全部统计，避免5次独立扫描和中间临时列表
+        tcp_ports = udp_ports = listening_ports = common_ports = 0
+        process_stats = Counter()
+        user_stats = Counter()
+        common_set = _COMMON_PORTS
+
         for port in ports:
-            user = port.get('user', 'unknown')
-            if user not in user_stats:
-                user_stats[user] = 0
-            user_stats[user] += 1
-        
+            protocol = port.get('protocol')
+            tcp_ports += protocol == 'TCP'
+            udp_ports += protocol == 'UDP'
+            listening_ports += port.get('state') == 'LISTEN'
+            common_ports += port.get('port', 0) in common_set
+            process_stats[port.get('process_name', 'unknown')] += 1
+            user_stats[port.get('user', 'unknown')] += 1
+
         return {
-            'total_ports': total_ports,
+            'total_ports': len(ports),
             'tcp_ports': tcp_ports,
             'udp_ports': udp_ports,
             'listening_ports': listening_ports,
-            'process_distribution': process_stats,
-            'user_distribution': user_stats,
-            'common_ports': len([p for p in ports if p.get('port', 0) in [22, 80, 443, 3306, 5432]])
+            'process_distribution': dict(process_stats),
+            'user_distribution': dict(user_stats),
+            'common_ports': common_ports
         }
 
+# 字节单位表：下标即1024的幂次
+_UNITS = ('B', 'KB', 'MB', 'GB', 'TB', 'PB')
+
+
+@lru_cache(maxsize=4096)
+def _fmt_ts_cached(timestamp: str) -> str:
+    """解析+格式化ISO时间戳字符串（批量导出时同一时间戳大量重复）"""
+    # 只在确实含'Z'时才replace，避免无谓的字符串拷贝
+    if 'Z' in timestamp:
+        timestamp = timestamp.replace('Z', '+00:00')
+    return datetime.fromisoformat(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+
 class DataFormatter:
     """数据格式化工具"""
-    
+
     @staticmethod
     def format_timestamp(timestamp: str) -> str:
         """格式化时间戳"""
         try:
             if isinstance(timestamp, str):
-                dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-            else:
-                dt = timestamp
-            return dt.strftime('%Y-%m-%d %H:%M:%S')
+                # 字符串路径走缓存：扫描周期对齐的时间戳重复率极高
+                return _fmt_ts_cached(timestamp)
+            return timestamp.strftime('%Y-%m-%d %H:%M:%S')
         except:
             return str(timestamp)
     
     @staticmethod
     def format_bytes(size: int) -> str:
         """格式化字节大小"""
-        for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-            if size < 1024.0:
-                return f"{size:.2f} {unit}"
-            size /= 1024.0
-        return f"{size:.2f} PB"
-    
+        # O(1)定位单位档位：bit_length等价于⌊log2⌋，整数移位代替逐级除法；
+        # 档位用int(size)选取以兼容浮点入参，数值本身按原值除，保持精度
+        if size <= 0:
+            return f"{size:.2f} B"
+        idx = min(max(int(size).bit_length() - 1, 0) // 10, len(_UNITS) - 1)
+        return f"{size / (1 << (idx * 10)):.2f} {_UNITS[idx]}"
+
     @staticmethod
     def format_duration(seconds: int) -> str:
         """格式化时间间隔"""
         if seconds < 60:
             return f"{seconds}秒"
-        elif seconds < 3600:
-            return f"{seconds // 60}分{seconds % 60}秒"
-        else:
-            return f"{seconds // 3600}时{(seconds % 3600) // 60}分"
+        minutes, secs = divmod(seconds, 60)
+        if seconds < 3600:
+            return f"{minutes}分{secs}秒"
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours}时{minutes}分"
+
+# 可疑进程关键词：预编译成单个正则，一次C层扫描同时匹配全部关键词，
+# 替代每个进程跑K轮Python子串判断（关键词列表增长时开销不变）
+_SUSPICIOUS_PROC_RE = re.compile('|'.join(
+    ('miner', 'backdoor', 'trojan', 'malware', 'exploit')))
+
 
 class SecurityChecker:
     """安全检查器"""
-    
+
     @staticmethod
     def check_suspicious_processes() -> List[Dict[str, Any]]:
         """检查可疑进程"""
-        suspicious_keywords = ['miner', 'backdoor', 'trojan', 'malware', 'exploit']
         suspicious_processes = []
-        
+
         try:
             for process in psutil.process_iter(['pid', 'name', 'cmdline']):
                 try:
                     process_info = process.info
-                    cmdline = ' '.join(process_info.get('cmdline', [])).lower()
-                    name = process_info.get('name', '').lower()
-                    
-                    for keyword in suspicious_keywords:
-                        if keyword in cmdline or keyword in name:
-                            suspicious_processes.append({
-                                'pid': process_info['pid'],
-                                'name': process_info['name'],
-                                'cmdline': process_info.get('cmdline', []),
-                                'reason': f"检测到可疑关键词: {keyword}"
-                            })
-                            break
-                            
+                    # 无权限时psutil会把cmdline/name置为None，or兜底避免join崩溃
+                    cmdline = ' '.join(process_info.get('cmdline') or [])
+                    name = process_info.get('name') or ''
+
+                    # 进程名+命令行拼成单串小写一次，正则单趟扫描所有关键词；
+                    # \x00分隔符保证关键词不会跨名称/命令行边界误拼出来
+                    match = _SUSPICIOUS_PROC_RE.search(f"{name}\x00{cmdline}".lower())
+                    if match:
+                        suspicious_processes.append({
+                            'pid': process_info['pid'],
+                            'name': name,
+                            'cmdline': process_info.get('cmdline') or [],
+                            'reason': f"检测到可疑关键词: {match.group()}"
+                        })
+
                 except (psutil.NoSuchProcess, psutil.AccessDenied):
                     continue
-                    
+
         except Exception as e:
             logger.error(f"检查可疑进程失败: {e}")
-        
+
         return suspicious_processes
     
     @staticmethod
     def check_unauthorized_ports(known_ports: List[int]) -> List[Dict[str, Any]]:
         """检查未授权端口"""
         unauthorized_ports = []
-        
+        # 列表参数转set：每个连接的成员判断从O(n)降到O(1)
+        known_ports = frozenset(known_ports)
+
         try:
-            for conn in psutil.net_connections(kind='inet'):
+            # 一次process_iter预取pid→进程属性表，替代逐连接构造
+            # psutil.Process（每个要读两次/proc，监听多的主机上是大头）
+            pid_map = {
+                p.info['pid']: p.info
+                for p in psutil.process_iter(['pid', 'name', 'username'])
+            }
+
+            for conn in _cached_net_connections():
                 if conn.status == 'LISTEN' and conn.laddr:
                     port = conn.laddr.port
                     if port not in known_ports and port > 1024:  # 忽略特权端口
-                        try:
-                            process = psutil.Process(conn.pid)
-                            unauthorized_ports.append({
-                                'port': port,
-                                'pid': conn.pid,
-                                'process_name': process.name(),
-                                'protocol': 'TCP',
-                                'user': process.username()
-                            })
-                        except psutil.NoSuchProcess:
-                            unauthorized_ports.append({
-                                'port': port,
-                                'pid': conn.pid,
-                                'process_name': 'unknown',
-                                'protocol': 'TCP',
-                                'user': 'unknown'
-                            })
+                        info = pid_map.get(conn.pid)
+                        unauthorized_ports.append({
+                            'port': port,
+                            'pid': conn.pid,
+                            'process_name': info['name'] if info else 'unknown',
+                            'protocol': 'TCP',
+                            'user': info['username'] if info else 'unknown'
+                        })
         except Exception as e:
             logger.error(f"检查未授权端口失败: {e}")
-        
+
         return unauthorized_ports
 
+# 健康状态缓存：多个仪表盘并发轮询时，TTL窗口内只有一个调用者
+# 真正去读psutil，其余直接复用快照（singleflight）
+_HEALTH_TTL = 0.5
+_HEALTH_CACHE = {'t': 0.0, 'v': {}}
+_HEALTH_LOCK = threading.Lock()
+
+
 def get_system_health() -> Dict[str, Any]:
-    """获取系统健康状态"""
+    """获取系统健康状态（500ms内的并发调用共享同一份快照）"""
+    now = time.monotonic()
+    if now - _HEALTH_CACHE['t'] < _HEALTH_TTL:
+        return _HEALTH_CACHE['v']
+
+    with _HEALTH_LOCK:
+        # 双重检查：等锁期间其他线程可能已刷新
+        now = time.monotonic()
+        if now - _HEALTH_CACHE['t'] < _HEALTH_TTL:
+            return _HEALTH_CACHE['v']
+        value = _compute_system_health()
+        _HEALTH_CACHE['v'] = value
+        _HEALTH_CACHE['t'] = now
+        return value
+
+
+def _compute_system_health() -> Dict[str, Any]:
+    """实际采集系统健康状态"""
     try:
-        # CPU 使用率
-        cpu_percent = psutil.cpu_percent(interval=1)
+        # CPU 使用率（非阻塞，计数器已在模块导入时预热）
+        cpu_percent = psutil.cpu_percent(interval=None)
         
         # 内存使用率
         memory = psutil.virtual_memory()
@@ -285,7 +490,7 @@ def get_system_health() -> Dict[str, Any]:
         return {
             'cpu': {
                 'percent': cpu_percent,
-                'cores': psutil.cpu_count(),
+                'cores': _CPU_COUNT,
                 'load_avg': load_avg
             },
             'memory': {
@@ -306,7 +511,7 @@ def get_system_health() -> Dict[str, Any]:
                 'packets_sent': net_io.packets_sent,
                 'packets_recv': net_io.packets_recv
             },
-            'boot_time': psutil.boot_time(),
+            'boot_time': _BOOT_TIME,
             'users': [user.name for user in psutil.users()]
         }
     except Exception as e:
@@ -317,15 +522,17 @@ def export_data(data: Any, format_type: str = 'json') -> str:
     """导出数据"""
     try:
         if format_type == 'json':
-            return json.dumps(data, indent=2, ensure_ascii=False, default=str)
+            return _json_dumps(data)
         elif format_type == 'csv':
-            # 简化的 CSV 导出
+            # csv.writer（C实现）整批写出，并正确处理含逗号/引号/换行的字段
             if isinstance(data, list) and data:
-                headers = data[0].keys()
-                csv_lines = [','.join(headers)]
-                for item in data:
-                    csv_lines.append(','.join(str(item.get(h, '')) for h in headers))
-                return '\n'.join(csv_lines)
+                headers = list(data[0].keys())
+                buf = io.StringIO()
+                writer = csv.writer(buf)
+                writer.writerow(headers)
+                writer.writerows([item.get(h, '') for h in headers]
+                                 for item in data)
+                return buf.getvalue()
         return str(data)
     except Exception as e:
         logger.error(f"导出数据失败: {e}")
@@ -1,17 +1,39 @@
 import psutil
 import datetime
+import threading
+import time
+
+# 导入时预热CPU计数器：之后interval=None直接返回自上次调用以来的
+# 使用率，不再阻塞调用线程1秒（调用间隔短于~100ms时数值意义不大）
+psutil.cpu_percent(interval=None)
+
+# 系统信息缓存：TTL窗口内的并发轮询共享同一份快照（singleflight）
+_INFO_TTL = 0.5
+_INFO_CACHE = {'t': 0.0, 'v': {}}
+_INFO_LOCK = threading.Lock()
 
 def get_system_info():
-    """获取系统信息"""
-    return {
-        'cpu_percent': psutil.cpu_percent(interval=1),
-        'memory_percent': psutil.virtual_memory().percent,
-        'disk_usage': psutil.disk_usage('/').percent,
-        'boot_time': datetime.datetime.fromtimestamp(
-            psutil.boot_time()
-        ).strftime('%Y-%m-%d %H:%M:%S'),
-        'users': [user.name for user in psutil.users()]
-    }
+    """获取系统信息（500ms内的并发调用共享同一份快照）"""
+    now = time.monotonic()
+    if now - _INFO_CACHE['t'] < _INFO_TTL:
+        return _INFO_CACHE['v']
+
+    with _INFO_LOCK:
+        now = time.monotonic()
+        if now - _INFO_CACHE['t'] < _INFO_TTL:
+            return _INFO_CACHE['v']
+        value = {
+            'cpu_percent': psutil.cpu_percent(interval=None),
+            'memory_percent': psutil.virtual_memory().percent,
+            'disk_usage': psutil.disk_usage('/').percent,
+            'boot_time': datetime.datetime.fromtimestamp(
+                psutil.boot_time()
+            ).strftime('%Y-%m-%d %H:%M:%S'),
+            'users': [user.name for user in psutil.users()]
+        }
+        _INFO_CACHE['v'] = value
+        _INFO_CACHE['t'] = now
+        return value
 
 def get_system_load():
     """获取系统负载"""
@@ -0,0 +1,22 @@
+"""生产环境WSGI入口
+
+开发环境直接运行 app.py（Werkzeug单线程dev server）；
+生产环境使用gunicorn多worker部署，避免单线程串行处理请求：
+
+    gunicorn -k gevent -w 4 -b 0.0.0.0:5739 wsgi:application
+
+未安装gevent时可退回线程worker：
+
+    gunicorn -k gthread -w 4 --threads 4 -b 0.0.0.0:5739 wsgi:application
+"""
+
+# gevent monkey-patch必须在其他模块导入前执行，使socket/DB等待协作式调度
+try:
+    from gevent import monkey
+    monkey.patch_all()
+except ImportError:
+    pass
+
+from app import create_app
+
+application = create_app()